@@ -7,7 +7,27 @@ cd "$ROOT"
 KEY_DIR="$ROOT/.secrets/plugin-signing"
 PRIV="$KEY_DIR/ed25519.private"
 
-echo "building python-tools variants (macos_universal)"
+# Optional args: variants to build (minimal, system, ds). Default: all of them.
+if [[ $# -gt 0 ]]; then
+  VARIANTS=("$@")
+else
+  VARIANTS=(minimal system ds)
+fi
+
+variant_config() {
+  case "$1" in
+    minimal) echo "scripts/plugins/config/python-tools.json" ;;
+    system) echo "scripts/plugins/config/python-tools-system.json" ;;
+    ds) echo "scripts/plugins/config/python-tools-ds.json" ;;
+    *) echo "unknown variant: $1" >&2; return 1 ;;
+  esac
+}
+
+for variant in "${VARIANTS[@]}"; do
+  variant_config "$variant" >/dev/null
+done
+
+echo "building python-tools variants (macos_universal): ${VARIANTS[*]}"
 
 if [[ ! -f "$PRIV" ]]; then
   echo "no plugin signing key found; generating dev keypair at $KEY_DIR"
@@ -33,10 +53,14 @@ if [[ ! -d "$ROOT/python-bundle-ds" ]]; then
   bash scripts/build-python-bundle.sh --datascience --output-dir "$ROOT/python-bundle-ds"
 fi
 
-echo "building signed plugin zip(s)..."
-python3 scripts/plugins/build_bundle.py --config scripts/plugins/config/python-tools.json --platform macos_universal --key "$PRIV"
-python3 scripts/plugins/build_bundle.py --config scripts/plugins/config/python-tools-system.json --platform macos_universal --key "$PRIV"
-python3 scripts/plugins/build_bundle.py --config scripts/plugins/config/python-tools-ds.json --platform macos_universal --key "$PRIV"
+# Each finished variant is announced as "READY <variant> <zip_path>" on stdout so a caller
+# can start uploading it while the next one builds.
+echo "building signed plugin zip(s): ${VARIANTS[*]}"
+for variant in "${VARIANTS[@]}"; do
+  zip_path="$(python3 -u scripts/plugins/build_bundle.py --config "$(variant_config "$variant")" --platform macos_universal --key "$PRIV" \
+    | tee /dev/stderr | sed -n 's/^built //p')"
+  echo "READY $variant $zip_path"
+done
 
 echo "done"
 
@@ -3,34 +3,110 @@ import argparse
 import base64
 import json
 import os
+import struct
 import subprocess
 import sys
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def send(proc: subprocess.Popen, msg: dict) -> None:
-    line = json.dumps(msg, separators=(",", ":"))
+try:
+    import pybase64
+except ImportError:  # optional SIMD decoder; stdlib is fine for small charts
+    pybase64 = None
+
+
+FRAME_HEADER = struct.Struct("<I")
+# Base64 characters decoded per step; a multiple of 4 so slices stay on quantum boundaries.
+B64_DECODE_CHUNK = 4 * 1024 * 1024
+
+
+def send(proc: subprocess.Popen, framing: str, msg: dict) -> None:
+    if orjson is not None:
+        payload = orjson.dumps(msg)
+    else:
+        payload = json.dumps(msg, separators=(",", ":")).encode("utf-8")
     assert proc.stdin is not None
-    proc.stdin.write(line + "\n")
+    if framing == "length-prefixed":
+        proc.stdin.write(FRAME_HEADER.pack(len(payload)))
+        proc.stdin.write(payload)
+    else:
+        proc.stdin.write(payload + b"\n")
     proc.stdin.flush()
 
 
-def recv(proc: subprocess.Popen) -> dict:
+def recv(proc: subprocess.Popen, framing: str) -> dict:
     assert proc.stdout is not None
-    line = proc.stdout.readline()
-    if not line:
-        raise RuntimeError("worker stdout closed")
-    return json.loads(line)
-
-
-def extract_png_bytes(result_value: object) -> bytes:
+    if framing == "length-prefixed":
+        header = proc.stdout.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise RuntimeError("worker stdout closed")
+        (size,) = FRAME_HEADER.unpack(header)
+        payload = proc.stdout.read(size)
+        if len(payload) < size:
+            raise RuntimeError("worker stdout closed")
+    else:
+        payload = proc.stdout.readline()
+        if not payload:
+            raise RuntimeError("worker stdout closed")
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def b64decode(data: str) -> bytes:
+    if pybase64 is not None:
+        return pybase64.b64decode(data, validate=False)
+    return base64.b64decode(data)
+
+
+def write_png_bytes(result_value: object, out_path: Path) -> None:
     if isinstance(result_value, dict) and result_value.get("type") == "bytes":
         data = result_value.get("data")
         if isinstance(data, str) and data.strip():
-            return base64.b64decode(data)
+            # Chunking needs 4-char alignment, so drop any line wrapping first.
+            if any(ws in data for ws in " \t\n\r\v\f"):
+                data = "".join(data.split())
+            # Decode 4-char-aligned slices into a .part file and rename it on success, so
+            # neither the full decoded PNG nor an ASCII copy of the input is held in
+            # memory, and a bad payload never leaves a truncated out_path behind.
+            tmp_path = out_path.with_name(out_path.name + ".part")
+            try:
+                with tmp_path.open("wb") as f:
+                    for start in range(0, len(data), B64_DECODE_CHUNK):
+                        f.write(b64decode(data[start : start + B64_DECODE_CHUNK]))
+                os.replace(tmp_path, out_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            return
     raise RuntimeError(f"unexpected result payload (expected bytes result): {result_value!r}")
 
 
+def save_png(result_value: object, out_path: Path) -> None:
+    # Workers that honour output_sink hand back a file_ref; older ones inline base64 bytes.
+    if isinstance(result_value, dict) and result_value.get("type") == "file_ref":
+        os.replace(result_value["path"], out_path)
+        return
+    write_png_bytes(result_value, out_path)
+
+
+def stop_worker(proc: subprocess.Popen, timeout: float = 5.0) -> None:
+    # The worker exits on shutdown or stdin EOF; only SIGKILL it if it hangs.
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(description="Generate a chart via python_sandbox and save it to a PNG.")
     ap.add_argument(
@@ -48,12 +124,21 @@ def main() -> int:
         default=str(Path("dist/demo_chart.png")),
         help="Output PNG path",
     )
+    ap.add_argument(
+        "--framing",
+        default="lines",
+        choices=["lines", "length-prefixed"],
+        help="Worker stdio framing ('length-prefixed' needs a worker with --framing support)",
+    )
     args = ap.parse_args()
 
     worker = Path(args.worker).resolve()
     python_path = Path(args.python_path).resolve()
     out_path = Path(args.out).resolve()
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    sink_path = out_path.with_name(out_path.name + ".part")
+    # The worker never overwrites an existing output_sink file; clear a leftover one.
+    sink_path.unlink(missing_ok=True)
 
     if not worker.exists():
         print(f"error: worker not found: {worker}", file=sys.stderr)
@@ -66,17 +151,18 @@ def main() -> int:
     env.setdefault("RUST_LOG", "info")
 
     proc = subprocess.Popen(
-        [str(worker)],
+        [str(worker), "--framing", args.framing],
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
+        bufsize=1024 * 1024,
         env=env,
     )
 
     try:
         send(
             proc,
+            args.framing,
             {
                 "jsonrpc": "2.0",
                 "id": 1,
@@ -88,7 +174,7 @@ def main() -> int:
                 },
             },
         )
-        _ = recv(proc)
+        _ = recv(proc, args.framing)
 
         code = r"""
 import io
@@ -114,6 +200,7 @@ result = buf.getvalue()
 
         send(
             proc,
+            args.framing,
             {
                 "jsonrpc": "2.0",
                 "id": 2,
@@ -127,24 +214,22 @@ result = buf.getvalue()
                         "timeout_seconds": 90,
                         "code": code,
                         "inputs": {},
+                        "output_sink": {"type": "file", "path": str(sink_path)},
                     },
                 },
             },
         )
-        out = recv(proc).get("result", {})
-        structured = out.get("structuredContent", {})
-        payload = structured.get("output", {})
-        png_bytes = extract_png_bytes(payload.get("result"))
-
-        out_path.write_bytes(png_bytes)
+        resp = recv(proc, args.framing)
+        try:
+            result_value = resp["result"]["structuredContent"]["output"]["result"]
+        except (KeyError, TypeError):
+            raise RuntimeError(f"unexpected python_sandbox response: {resp!r}") from None
+        save_png(result_value, out_path)
         print(f"wrote: {out_path}")
 
-        send(proc, {"jsonrpc": "2.0", "id": 3, "method": "shutdown", "params": {}})
+        send(proc, args.framing, {"jsonrpc": "2.0", "id": 3, "method": "shutdown", "params": {}})
     finally:
-        try:
-            proc.kill()
-        except Exception:
-            pass
+        stop_worker(proc)
 
     return 0
 
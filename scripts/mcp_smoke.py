@@ -2,22 +2,62 @@
 import argparse
 import json
 import os
+import struct
 import subprocess
 import sys
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def send(proc: subprocess.Popen, msg: dict) -> None:
-    line = json.dumps(msg, separators=(",", ":"))
-    proc.stdin.write(line + "\n")
+
+FRAME_HEADER = struct.Struct("<I")
+
+
+def send(proc: subprocess.Popen, framing: str, msg: dict) -> None:
+    if orjson is not None:
+        payload = orjson.dumps(msg)
+    else:
+        payload = json.dumps(msg, separators=(",", ":")).encode("utf-8")
+    if framing == "length-prefixed":
+        proc.stdin.write(FRAME_HEADER.pack(len(payload)))
+        proc.stdin.write(payload)
+    else:
+        proc.stdin.write(payload + b"\n")
     proc.stdin.flush()
 
 
-def recv(proc: subprocess.Popen) -> dict:
-    line = proc.stdout.readline()
-    if not line:
-        raise RuntimeError("worker stdout closed")
-    return json.loads(line)
+def recv(proc: subprocess.Popen, framing: str) -> dict:
+    if framing == "length-prefixed":
+        header = proc.stdout.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise RuntimeError("worker stdout closed")
+        (size,) = FRAME_HEADER.unpack(header)
+        payload = proc.stdout.read(size)
+        if len(payload) < size:
+            raise RuntimeError("worker stdout closed")
+    else:
+        payload = proc.stdout.readline()
+        if not payload:
+            raise RuntimeError("worker stdout closed")
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def stop_worker(proc: subprocess.Popen, timeout: float = 5.0) -> None:
+    # The worker exits on shutdown or stdin EOF; only SIGKILL it if it hangs.
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
 
 
 def main() -> int:
@@ -33,6 +73,12 @@ def main() -> int:
         help="Explicit python executable path (used to avoid requiring an installed plugin dir)",
     )
     ap.add_argument("--policy-id", default="balanced", help="policy_id to pass to python_sandbox")
+    ap.add_argument(
+        "--framing",
+        default="lines",
+        choices=["lines", "length-prefixed"],
+        help="Worker stdio framing ('length-prefixed' needs a worker with --framing support)",
+    )
     args = ap.parse_args()
 
     worker = Path(args.worker).resolve()
@@ -49,11 +95,11 @@ def main() -> int:
     env.setdefault("RUST_LOG", "info")
 
     proc = subprocess.Popen(
-        [str(worker)],
+        [str(worker), "--framing", args.framing],
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
+        bufsize=1024 * 1024,
         env=env,
     )
     assert proc.stdin and proc.stdout
@@ -61,6 +107,7 @@ def main() -> int:
     try:
         send(
             proc,
+            args.framing,
             {
                 "jsonrpc": "2.0",
                 "id": 1,
@@ -72,16 +119,17 @@ def main() -> int:
                 },
             },
         )
-        init = recv(proc)
+        init = recv(proc, args.framing)
         print("initialize:", init.get("result", {}))
 
-        send(proc, {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": {}})
-        tools = recv(proc)
+        send(proc, args.framing, {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": {}})
+        tools = recv(proc, args.framing)
         names = [t.get("name") for t in tools.get("result", {}).get("tools", [])]
         print("tools:", names)
 
         send(
             proc,
+            args.framing,
             {
                 "jsonrpc": "2.0",
                 "id": 3,
@@ -97,16 +145,13 @@ def main() -> int:
                 },
             },
         )
-        out = recv(proc)
+        out = recv(proc, args.framing)
         print("python_sandbox:", json.dumps(out.get("result", {}), indent=2))
 
         # Graceful shutdown
-        send(proc, {"jsonrpc": "2.0", "id": 4, "method": "shutdown", "params": {}})
+        send(proc, args.framing, {"jsonrpc": "2.0", "id": 4, "method": "shutdown", "params": {}})
     finally:
-        try:
-            proc.kill()
-        except Exception:
-            pass
+        stop_worker(proc)
 
     return 0
 
@@ -1,16 +1,27 @@
 #!/usr/bin/env python3
 import argparse
+import collections
+import concurrent.futures
+import ctypes
+import functools
 import hashlib
 import json
 import os
 import shutil
 import subprocess
+import sys
 import tempfile
 import zipfile
+import zlib
 from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 FIXED_ZIP_DT = (1980, 1, 1, 0, 0, 0)
 REPO_ROOT = Path(__file__).resolve().parents[2]
@@ -22,6 +33,27 @@ MACOS_MACHO_MAGICS = {
     b"\xca\xfe\xba\xbe",  # FAT_MAGIC
     b"\xbe\xba\xfe\xca",  # FAT_CIGAM
 }
+ZIP_COMPRESSLEVEL = 6
+# Paths per /usr/bin/codesign invocation; keeps argv well under ARG_MAX.
+CODESIGN_BATCH_SIZE = 256
+# Payloads above this size are streamed straight into the zip instead of being
+# compressed in memory on a worker thread.
+ZIP_PARALLEL_MAX_BYTES = 16 * 1024 * 1024
+# Upper bound on uncompressed bytes queued for parallel compression at once.
+ZIP_INFLIGHT_BYTES = 128 * 1024 * 1024
+# Already-compressed formats; deflating them again burns CPU for no size win.
+ZIP_STORED_SUFFIXES = {
+    ".bz2",
+    ".gif",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".npz",
+    ".png",
+    ".whl",
+    ".xz",
+    ".zip",
+}
 
 
 @dataclass(frozen=True)
@@ -32,6 +64,8 @@ class PayloadFile:
 
 
 def load_json(path: Path) -> dict:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
     with path.open("r", encoding="utf-8") as f:
         return json.load(f)
 
@@ -50,22 +84,72 @@ def normalize_dest(path: Path) -> str:
 
 
 def sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
     with path.open("rb") as f:
+        # Python 3.11+: hash straight from the file buffer without a Python-level loop.
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
         for chunk in iter(lambda: f.read(1024 * 1024), b""):
             h.update(chunk)
     return h.hexdigest()
 
 
+def warn_if_sha256_unaccelerated() -> None:
+    # Without OpenSSL, hashlib falls back to its bundled SHA-256, which skips the
+    # SHA-NI / ARMv8 SHA2 instructions and makes hashing large bundles much slower.
+    if getattr(hashlib.sha256, "__name__", "") != "openssl_sha256":
+        print(
+            "warning: hashlib.sha256 is not OpenSSL-backed; payload hashing will be slow",
+            file=sys.stderr,
+        )
+
+
+def hash_payloads(payloads: dict) -> OrderedDict:
+    # hashlib releases the GIL while hashing, so threads scale across files.
+    dests = sorted(payloads.keys())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        digests = pool.map(sha256_file, [payloads[dest].source for dest in dests])
+        return OrderedDict(zip(dests, digests))
+
+
+@functools.lru_cache(maxsize=None)
 def is_macho_binary(path: Path) -> bool:
+    # Cached: stage_payloads and codesign_macos_payloads both probe every payload.
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
     try:
-        with path.open("rb") as f:
-            magic = f.read(4)
+        magic = os.pread(fd, 4, 0)
     except OSError:
         return False
+    finally:
+        os.close(fd)
     return magic in MACOS_MACHO_MAGICS
 
 
+@functools.lru_cache(maxsize=None)
+def load_clonefile():
+    if sys.platform != "darwin":
+        return None
+    try:
+        clonefile = ctypes.CDLL("/usr/lib/libSystem.dylib", use_errno=True).clonefile
+    except (OSError, AttributeError):
+        return None
+    clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32]
+    clonefile.restype = ctypes.c_int
+    return clonefile
+
+
+def copy_payload(src: Path, dest: Path) -> None:
+    # On APFS, clonefile(2) makes a copy-on-write clone in O(1). Anything it can't
+    # handle (other filesystems, cross-volume) falls back to a byte copy.
+    clonefile = load_clonefile()
+    if clonefile is not None and clonefile(os.fsencode(src), os.fsencode(dest), 0) == 0:
+        return
+    shutil.copy2(src, dest, follow_symlinks=True)
+
+
 def stage_payloads(payloads: dict, stage_root: Path) -> dict:
     staged = {}
     for dest, payload in payloads.items():
@@ -73,7 +157,7 @@ def stage_payloads(payloads: dict, stage_root: Path) -> dict:
         if is_macho_binary(payload.source):
             dest_path = (stage_root / dest).resolve()
             dest_path.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(payload.source, dest_path, follow_symlinks=True)
+            copy_payload(payload.source, dest_path)
             os.chmod(dest_path, payload.mode)
             staged_src = dest_path
         else:
@@ -113,29 +197,38 @@ def codesign_macos_payloads(payloads: dict, identity: str) -> None:
 
     print(f"🔏 codesign (macOS): {len(macho_entries)} Mach-O payload files")
 
+    # codesign accepts many paths per invocation, so sign each entitlements group in
+    # batches instead of paying a fork/exec per file.
+    groups: dict[Path | None, list[Path]] = {}
     for dest, src in macho_entries:
         entitlements = None
         if dest.endswith("bin/macos/universal/rzn-python-worker"):
             entitlements = worker_entitlements
         elif dest in ("resources/python/bin/python3", "resources/python/bin/python"):
             entitlements = python_entitlements
-
-        requested_mode = src.stat().st_mode & 0o777
-        os.chmod(src, requested_mode | 0o200)
-        try:
-            cmd = [
-                "/usr/bin/codesign",
-                "--force",
-                "--sign",
-                identity,
-                "--timestamp=none",
-            ]
-            if entitlements is not None:
-                cmd += ["--entitlements", str(entitlements)]
-            cmd.append(str(src))
-            subprocess.run(cmd, check=True)
-        finally:
-            os.chmod(src, requested_mode)
+        groups.setdefault(entitlements, []).append(src)
+
+    for entitlements, srcs in groups.items():
+        for start in range(0, len(srcs), CODESIGN_BATCH_SIZE):
+            batch = srcs[start : start + CODESIGN_BATCH_SIZE]
+            requested_modes = [src.stat().st_mode & 0o777 for src in batch]
+            try:
+                for src, requested_mode in zip(batch, requested_modes):
+                    os.chmod(src, requested_mode | 0o200)
+                cmd = [
+                    "/usr/bin/codesign",
+                    "--force",
+                    "--sign",
+                    identity,
+                    "--timestamp=none",
+                ]
+                if entitlements is not None:
+                    cmd += ["--entitlements", str(entitlements)]
+                cmd += [str(src) for src in batch]
+                subprocess.run(cmd, check=True)
+            finally:
+                for src, requested_mode in zip(batch, requested_modes):
+                    os.chmod(src, requested_mode)
 
 
 def add_payload_file(payloads: dict, source: Path, dest: str, mode: int) -> None:
@@ -146,6 +239,29 @@ def add_payload_file(payloads: dict, source: Path, dest: str, mode: int) -> None
     payloads[dest] = PayloadFile(source=source, dest=dest, mode=mode)
 
 
+def iter_tree(root: Path):
+    # Same walk as os.walk(root) with sorted names: files before subdirectories,
+    # symlinked directories are not followed, unreadable directories are skipped.
+    # DirEntry caches the file type, so no extra stat per entry.
+    stack = [(str(root), "")]
+    while stack:
+        dir_path, rel = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append((entry.path, entry_rel))
+            else:
+                yield entry, entry_rel
+        stack.extend(reversed(subdirs))
+
+
 def collect_payloads(config: dict, platform: str) -> dict:
     payloads: dict[str, PayloadFile] = {}
 
@@ -160,16 +276,10 @@ def collect_payloads(config: dict, platform: str) -> dict:
         dest_root = Path(item.get("dest", "")).as_posix()
         mode = int(str(item.get("mode", "644")), 8)
         if source_path.is_dir():
-            for root, dirs, files in os.walk(source_path):
-                dirs.sort()
-                root_path = Path(root)
-                files_sorted = sorted(files)
-                for fname in files_sorted:
-                    file_path = root_path / fname
-                    rel = file_path.relative_to(source_path)
-                    dest = normalize_dest(Path(dest_root) / rel)
-                    file_mode = mode if mode != 0o644 else (file_path.stat().st_mode & 0o777)
-                    add_payload_file(payloads, file_path, dest, file_mode)
+            for entry, rel in iter_tree(source_path):
+                dest = normalize_dest(Path(dest_root) / rel)
+                file_mode = mode if mode != 0o644 else (entry.stat().st_mode & 0o777)
+                add_payload_file(payloads, Path(entry.path), dest, file_mode)
         else:
             dest = normalize_dest(Path(dest_root))
             if not dest:
@@ -219,7 +329,29 @@ def build_manifest(config: dict, platform: str, sha_map: OrderedDict) -> Ordered
     return manifest
 
 
+def contains_float(value: object) -> bool:
+    if isinstance(value, float):
+        return True
+    if isinstance(value, dict):
+        return any(contains_float(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(contains_float(v) for v in value)
+    return False
+
+
 def write_manifest(path: Path, manifest: OrderedDict) -> None:
+    # plugin.sig covers these exact bytes, so orjson is only used when its output is
+    # identical to the stdlib encoding below. It writes non-ASCII and DEL (0x7f) raw
+    # instead of as \uXXXX, and formats some floats differently; those manifests use
+    # stdlib json.
+    if orjson is not None and not contains_float(manifest):
+        try:
+            content = orjson.dumps(manifest, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            content = b""
+        if content and content.isascii() and b"\x7f" not in content:
+            path.write_bytes(content + b"\n")
+            return
     content = json.dumps(manifest, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
     path.write_text(content + "\n", encoding="utf-8")
 
@@ -252,12 +384,69 @@ def sign_manifest(key_path: Path, manifest_path: Path, sig_path: Path) -> None:
     subprocess.run(cmd, check=True)
 
 
+def zip_compress_type(path: Path) -> int:
+    if path.suffix.lower() in ZIP_STORED_SUFFIXES:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def payload_zipinfo(payload: PayloadFile, size: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(payload.dest, FIXED_ZIP_DT)
+    info.compress_type = zip_compress_type(payload.source)
+    info.external_attr = (payload.mode & 0o777) << 16
+    info.file_size = size
+    return info
+
+
+def compress_payload(payload: PayloadFile) -> tuple[zipfile.ZipInfo, bytes]:
+    data = payload.source.read_bytes()
+    info = payload_zipinfo(payload, len(data))
+    info.CRC = zlib.crc32(data)
+    if info.compress_type == zipfile.ZIP_DEFLATED:
+        # Raw deflate stream, same parameters zipfile uses for ZIP_DEFLATED entries.
+        compressor = zlib.compressobj(ZIP_COMPRESSLEVEL, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+    info.compress_size = len(data)
+    return info, data
+
+
+def write_precompressed(zf: zipfile.ZipFile, info: zipfile.ZipInfo, data: bytes) -> None:
+    # Writes the same local header + body that ZipFile.open(info, "w") produces on a
+    # seekable file; ZipFile.close() then emits the central directory from filelist.
+    # This goes through undocumented ZipFile internals (fp, start_dir, filelist,
+    # NameToInfo, ZipInfo.FileHeader) as laid out in CPython 3.8-3.13, and skips
+    # zipfile's lock, open-handle guard and duplicate-name warning. That is fine here:
+    # only the calling thread writes, no write handle is open, and payload names are
+    # unique. Re-check this against new Python releases; write_zip re-reads the
+    # finished archive so a mismatch fails the build instead of shipping a bad zip.
+    assert not zf._writing, "write_precompressed with a zip write handle open"
+    zip64 = (
+        info.file_size * 1.05 > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT
+    )
+    info.header_offset = zf.fp.tell()
+    zf.fp.write(info.FileHeader(zip64))
+    zf.fp.write(data)
+    zf.filelist.append(info)
+    zf.NameToInfo[info.filename] = info
+    zf.start_dir = zf.fp.tell()
+    # close() only writes the central directory when this is set.
+    zf._didModify = True
+
+
+def stream_payload(zf: zipfile.ZipFile, payload: PayloadFile, size: int) -> None:
+    # Declaring the size up front lets zipfile pick zip64 only when needed; the file
+    # goes through the compressor in 1 MiB chunks instead of being loaded whole.
+    info = payload_zipinfo(payload, size)
+    with payload.source.open("rb") as src, zf.open(info, mode="w") as dst:
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+
+
 def write_zip(zip_path: Path, manifest_path: Path, sig_path: Path, payloads: dict) -> None:
     with zipfile.ZipFile(
         zip_path,
         "w",
         compression=zipfile.ZIP_DEFLATED,
-        compresslevel=9,
+        compresslevel=ZIP_COMPRESSLEVEL,
     ) as zf:
         for rel_path, src_path, mode in [
             ("plugin.json", manifest_path, 0o644),
@@ -267,16 +456,47 @@ def write_zip(zip_path: Path, manifest_path: Path, sig_path: Path, payloads: dic
             info.compress_type = zipfile.ZIP_DEFLATED
             info.external_attr = (mode & 0o777) << 16
             zf.writestr(info, src_path.read_bytes())
-        for dest in sorted(payloads.keys()):
-            payload = payloads[dest]
-            info = zipfile.ZipInfo(dest, FIXED_ZIP_DT)
-            info.compress_type = zipfile.ZIP_DEFLATED
-            info.external_attr = (payload.mode & 0o777) << 16
-            zf.writestr(info, payload.source.read_bytes())
 
-
-def build_bundle(config_path: Path, platform: str, key_path: Path, out_dir: Path) -> Path:
-    config = load_json(config_path)
+        # zlib releases the GIL while compressing, so small entries deflate in parallel
+        # on threads. Results are written in sorted order, and the queue is capped by
+        # uncompressed bytes, so at most ~2 * ZIP_INFLIGHT_BYTES (input + output) is
+        # held at once. Large entries are streamed on this thread once the queue ahead
+        # of them has been written.
+        workers = os.cpu_count() or 1
+        pending = collections.deque()
+        inflight = 0
+
+        def write_oldest() -> None:
+            nonlocal inflight
+            size, fut = pending.popleft()
+            write_precompressed(zf, *fut.result())
+            inflight -= size
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            for dest in sorted(payloads.keys()):
+                payload = payloads[dest]
+                size = payload.source.stat().st_size
+                if size > ZIP_PARALLEL_MAX_BYTES:
+                    while pending:
+                        write_oldest()
+                    stream_payload(zf, payload, size)
+                    continue
+                while pending and (
+                    inflight + size > ZIP_INFLIGHT_BYTES or len(pending) >= 2 * workers
+                ):
+                    write_oldest()
+                pending.append((size, pool.submit(compress_payload, payload)))
+                inflight += size
+            while pending:
+                write_oldest()
+
+    with zipfile.ZipFile(zip_path) as zf:
+        bad = zf.testzip()
+    if bad is not None:
+        raise RuntimeError(f"corrupt entry in {zip_path}: {bad}")
+
+
+def build_bundle(config: dict, platform: str, key_path: Path, out_dir: Path) -> Path:
     payloads = collect_payloads(config, platform)
 
     staging = out_dir / config["id"] / config["version"] / platform
@@ -292,9 +512,7 @@ def build_bundle(config_path: Path, platform: str, key_path: Path, out_dir: Path
             payloads = stage_payloads(payloads, staged_root)
             codesign_macos_payloads(payloads, codesign_identity)
 
-            sha_map = OrderedDict()
-            for dest in sorted(payloads.keys()):
-                sha_map[dest] = sha256_file(payloads[dest].source)
+            sha_map = hash_payloads(payloads)
             for res in config.get("resources", []):
                 res_path = res.get("path") if isinstance(res, dict) else res
                 if res_path and res_path not in sha_map:
@@ -311,9 +529,7 @@ def build_bundle(config_path: Path, platform: str, key_path: Path, out_dir: Path
             write_zip(zip_path, manifest_path, sig_path, payloads)
             return zip_path
 
-    sha_map = OrderedDict()
-    for dest in sorted(payloads.keys()):
-        sha_map[dest] = sha256_file(payloads[dest].source)
+    sha_map = hash_payloads(payloads)
     for res in config.get("resources", []):
         res_path = res.get("path") if isinstance(res, dict) else res
         if res_path and res_path not in sha_map:
@@ -343,6 +559,7 @@ def parse_args() -> argparse.Namespace:
 
 def main() -> int:
     args = parse_args()
+    warn_if_sha256_unaccelerated()
     config_path = Path(args.config).resolve()
     config = load_json(config_path)
     platforms = config.get("platforms", [])
@@ -359,7 +576,7 @@ def main() -> int:
     for platform in targets:
         if platforms and platform not in platforms:
             raise SystemExit(f"platform {platform} not in config platforms")
-        zip_path = build_bundle(config_path, platform, key_path, out_dir)
+        zip_path = build_bundle(config, platform, key_path, out_dir)
         print(f"built {zip_path}")
     return 0
 
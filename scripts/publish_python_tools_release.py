@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import argparse
+import concurrent.futures
+import functools
 import hashlib
 import json
 import os
@@ -7,33 +9,85 @@ import subprocess
 import sys
 import urllib.error
 import urllib.request
+from collections.abc import Collection, Iterable
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+except ImportError:
+    requests = None
+
 
 def sh(cmd: list[str], *, env: dict | None = None) -> None:
     subprocess.run(cmd, check=True, env=env)
 
 
 def sha256_hex(path: Path) -> str:
-    h = hashlib.sha256()
     with path.open("rb") as f:
+        # Python 3.11+: hash straight from the file buffer without a Python-level loop.
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
         for chunk in iter(lambda: f.read(1024 * 1024), b""):
             h.update(chunk)
     return h.hexdigest()
 
 
+@functools.lru_cache(maxsize=None)
+def http_session() -> "requests.Session":
+    # One pooled session per process: keep-alive across the register/publish calls and
+    # retries on transient gateway errors. Both admin calls resubmit the same release
+    # and catalog state, so replaying a POST after a 5xx is safe.
+    retry = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def http_post_json(url: str, token: str, payload: dict) -> dict:
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, method="POST", data=body)
-    req.add_header("Content-Type", "application/json")
-    req.add_header("Authorization", f"Bearer {token}")
-    try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-            return json.loads(raw) if raw.strip() else {}
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8", errors="replace")
-        raise RuntimeError(f"POST {url} failed: {e.code} {raw}") from None
+    body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+    if requests is not None:
+        resp = http_session().post(url, data=body, headers=headers, timeout=60)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"POST {url} failed: {resp.status_code} {resp.text}")
+        raw = resp.content
+    else:
+        req = urllib.request.Request(url, method="POST", data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                raw = resp.read()
+        except urllib.error.HTTPError as e:
+            raw = e.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"POST {url} failed: {e.code} {raw}") from None
+    if not raw.strip():
+        return {}
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8", errors="replace"))
 
 
 def ensure_file(path: Path, content: str) -> None:
@@ -42,15 +96,22 @@ def ensure_file(path: Path, content: str) -> None:
 
 
 def load_config(path: Path) -> dict:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
     return json.loads(path.read_text(encoding="utf-8"))
 
 
-def aws_env_from_r2() -> dict:
+def r2_credentials() -> tuple[str, str, str]:
     access_key = os.environ.get("R2_PLUGINS_ACCESS_KEY_ID", "").strip()
     secret_key = os.environ.get("R2_PLUGINS_SECRET_ACCESS_KEY", "").strip()
     region = os.environ.get("R2_PLUGINS_REGION", "auto").strip()
     if not access_key or not secret_key:
         raise RuntimeError("missing R2_PLUGINS_ACCESS_KEY_ID / R2_PLUGINS_SECRET_ACCESS_KEY")
+    return access_key, secret_key, region
+
+
+def aws_env_from_r2() -> dict:
+    access_key, secret_key, region = r2_credentials()
     env = os.environ.copy()
     env["AWS_ACCESS_KEY_ID"] = access_key
     env["AWS_SECRET_ACCESS_KEY"] = secret_key
@@ -58,39 +119,83 @@ def aws_env_from_r2() -> dict:
     return env
 
 
-def main() -> int:
-    ap = argparse.ArgumentParser(
-        description="Build + upload + register + publish python-tools to the backend catalog."
-    )
-    ap.add_argument(
-        "--config",
-        default="scripts/plugins/config/python-tools.json",
-        help="Plugin config JSON path",
-    )
-    ap.add_argument(
-        "--build-script",
-        default="scripts/build_python_tools_bundle_macos_universal.sh",
-        help="Build script to run when --skip-build is not set",
+@functools.lru_cache(maxsize=None)
+def r2_client(endpoint: str):
+    # One client per process; clients are thread-safe once built. Build it from a
+    # private Session because the module-level boto3 default session is not.
+    access_key, secret_key, region = r2_credentials()
+    return boto3.session.Session().client(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region,
+        config=BotoConfig(s3={"addressing_style": "path"}),
     )
-    ap.add_argument("--platform", default="macos_universal", help="Platform key")
-    ap.add_argument("--channel", default="stable", choices=["stable", "beta", "nightly"])
-    ap.add_argument(
-        "--catalog-version",
-        default="",
-        help="Optional RFC3339 catalog version; default uses backend now()",
+
+
+def r2_object_head(endpoint: str, bucket: str, key: str) -> dict | None:
+    # {"etag", "size"} of the object, or None if it is missing or we can't tell (no boto3).
+    if boto3 is None:
+        return None
+    try:
+        head = r2_client(endpoint).head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return {"etag": head["ETag"], "size": head["ContentLength"]}
+
+
+@functools.lru_cache(maxsize=None)
+def configure_aws_cli() -> None:
+    # Force path-style addressing for R2. This writes ~/.aws/config, so it runs once per
+    # process, before any concurrent uploads start.
+    sh(
+        ["aws", "configure", "set", "default.s3.addressing_style", "path"],
+        env=aws_env_from_r2(),
     )
-    ap.add_argument("--skip-build", action="store_true", help="Skip build steps")
-    ap.add_argument("--skip-upload", action="store_true", help="Skip R2 upload")
-    ap.add_argument("--skip-publish", action="store_true", help="Skip catalog publish")
-    args = ap.parse_args()
 
-    root = Path(__file__).resolve().parents[1]
-    config_path = (root / args.config).resolve()
-    config = load_config(config_path)
 
-    plugin_id = str(config["id"]).strip()
-    version = str(config["version"]).strip()
+def upload_to_r2(zip_path: Path, endpoint: str, bucket: str, key: str) -> None:
+    if boto3 is not None:
+        # In-process multipart upload: no aws CLI cold start, parts go up in parallel.
+        r2_client(endpoint).upload_file(
+            str(zip_path),
+            bucket,
+            key,
+            ExtraArgs={"ContentType": "application/zip"},
+            Config=TransferConfig(
+                multipart_threshold=8 * 1024 * 1024,
+                multipart_chunksize=16 * 1024 * 1024,
+                max_concurrency=8,
+            ),
+        )
+        return
+
+    env = aws_env_from_r2()
+    configure_aws_cli()
+    sh(
+        [
+            "aws",
+            "s3api",
+            "put-object",
+            "--endpoint-url",
+            endpoint,
+            "--bucket",
+            bucket,
+            "--key",
+            key,
+            "--body",
+            str(zip_path),
+            "--content-type",
+            "application/zip",
+        ],
+        env=env,
+    )
+
 
+def backend_settings() -> tuple[str, str]:
     backend_base = os.environ.get("RZN_BACKEND_BASE_URL", "").strip().rstrip("/")
     admin_token = os.environ.get("RZN_PLATFORM_ADMIN_TOKEN", "").strip()
     if not backend_base:
@@ -99,7 +204,10 @@ def main() -> int:
         )
     if not admin_token:
         raise RuntimeError("missing RZN_PLATFORM_ADMIN_TOKEN")
+    return backend_base, admin_token
 
+
+def r2_settings() -> tuple[str, str, str]:
     r2_bucket = os.environ.get("R2_PLUGINS_BUCKET", "").strip()
     r2_endpoint = os.environ.get("R2_PLUGINS_ENDPOINT", "").strip()
     r2_prefix = os.environ.get("R2_PLUGINS_PREFIX", "plugins").strip().strip("/")
@@ -107,74 +215,203 @@ def main() -> int:
         raise RuntimeError("missing R2_PLUGINS_BUCKET")
     if not r2_endpoint:
         raise RuntimeError("missing R2_PLUGINS_ENDPOINT")
+    return r2_bucket, r2_endpoint, r2_prefix
 
-    # 1) Build artifacts
-    if not args.skip_build:
-        sh(["bash", str((root / args.build_script).resolve())])
 
-    zip_name = f"{plugin_id}-{version}-{args.platform}.zip"
+def locate_release(root: Path, config_path: Path, platform: str, r2_prefix: str) -> dict:
+    config = load_config(config_path)
+    plugin_id = str(config["id"]).strip()
+    version = str(config["version"]).strip()
+
+    zip_name = f"{plugin_id}-{version}-{platform}.zip"
     zip_path = (
         root
         / "dist/plugins"
         / plugin_id
         / version
-        / args.platform
+        / platform
         / zip_name
     )
     if not zip_path.exists():
         raise RuntimeError(f"missing built zip: {zip_path}")
 
-    # 2) Upload to R2
-    artifact_key = f"{r2_prefix}/{plugin_id}/{version}/{args.platform}/{zip_name}"
-    if not args.skip_upload:
-        env = aws_env_from_r2()
-        # Force path-style addressing for R2.
-        sh(["aws", "configure", "set", "default.s3.addressing_style", "path"], env=env)
-        sh(
-            [
-                "aws",
-                "s3api",
-                "put-object",
-                "--endpoint-url",
-                r2_endpoint,
-                "--bucket",
-                r2_bucket,
-                "--key",
-                artifact_key,
-                "--body",
-                str(zip_path),
-                "--content-type",
-                "application/zip",
-            ],
-            env=env,
-        )
+    return {
+        "plugin_id": plugin_id,
+        "version": version,
+        "platform": platform,
+        "zip_path": zip_path,
+        "artifact_key": f"{r2_prefix}/{plugin_id}/{version}/{platform}/{zip_name}",
+    }
 
-    # 3) Register release
-    digest = sha256_hex(zip_path)
+
+def register_release(backend_base: str, admin_token: str, release: dict) -> None:
+    digest = sha256_hex(release["zip_path"])
     register_url = f"{backend_base}/admin/plugins/releases"
     reg = http_post_json(
         register_url,
         admin_token,
         {
-            "plugin_id": plugin_id,
-            "version": version,
-            "platform": args.platform,
-            "artifact_key": artifact_key,
+            "plugin_id": release["plugin_id"],
+            "version": release["version"],
+            "platform": release["platform"],
+            "artifact_key": release["artifact_key"],
             "artifact_sha256": digest,
             "notes": "pysandbox-rs publish",
         },
     )
     print("registered:", reg)
 
+
+def publish_catalog(backend_base: str, admin_token: str, channel: str, catalog_version: str) -> None:
+    publish_url = f"{backend_base}/admin/plugins/catalog/publish"
+    base_url = f"{backend_base}/plugins/artifacts"
+    payload = {"channel": channel, "base_url": base_url}
+    catalog_ver = catalog_version.strip()
+    if catalog_ver:
+        payload["catalog_version"] = catalog_ver
+    pub = http_post_json(publish_url, admin_token, payload)
+    print("published:", pub)
+
+
+def publish_many(
+    config_paths: list[Path],
+    platform: str,
+    channel: str,
+    catalog_version: str = "",
+    *,
+    skip_upload: bool = False,
+    skip_publish: bool = False,
+    uploaded: Collection[Path] = frozenset(),
+    ready: Iterable[Path] | None = None,
+    jobs: int = 8,
+) -> list[dict]:
+    # Upload + register several already-built plugin zips, then publish the catalog once.
+    # All of them share one S3 client and one HTTP session, so the R2 and backend
+    # handshakes are paid once instead of per variant. Configs in `uploaded` already
+    # have their artifact in R2 and are only registered. If given, `ready` yields the
+    # configs as their zips land on disk (e.g. while a build is still running), so each
+    # upload starts as soon as its zip exists.
+    root = Path(__file__).resolve().parents[1]
+    backend_base, admin_token = backend_settings()
+    r2_bucket, r2_endpoint, r2_prefix = r2_settings()
+
+    def release_one(path: Path) -> dict:
+        rel = locate_release(root, path, platform, r2_prefix)
+        if not skip_upload and path not in uploaded:
+            upload_to_r2(rel["zip_path"], r2_endpoint, r2_bucket, rel["artifact_key"])
+        register_release(backend_base, admin_token, rel)
+        return rel
+
+    if boto3 is None and not skip_upload:
+        configure_aws_cli()
+
+    futures: dict[Path, concurrent.futures.Future] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        for path in config_paths if ready is None else ready:
+            futures[path] = pool.submit(release_one, path)
+        done, pending = concurrent.futures.wait(
+            futures.values(), return_when=concurrent.futures.FIRST_EXCEPTION
+        )
+        for fut in pending:
+            fut.cancel()
+        for fut in done:
+            fut.result()
+
+    missing = [str(path) for path in config_paths if path not in futures]
+    if missing:
+        raise RuntimeError(f"no built zip reported for: {missing}")
+    releases = [futures[path].result() for path in config_paths]
+
+    if not skip_publish:
+        publish_catalog(backend_base, admin_token, channel, catalog_version)
+
+    return releases
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(
+        description="Build + upload + register + publish python-tools to the backend catalog."
+    )
+    ap.add_argument(
+        "--config",
+        default="scripts/plugins/config/python-tools.json",
+        help="Plugin config JSON path",
+    )
+    ap.add_argument(
+        "--configs",
+        action="append",
+        default=[],
+        help="Comma list of already-built plugin config JSON paths to upload + register "
+        "together (repeatable; overrides --config, requires --skip-build); the catalog "
+        "is published once at the end",
+    )
+    ap.add_argument(
+        "--build-script",
+        default="scripts/build_python_tools_bundle_macos_universal.sh",
+        help="Build script to run when --skip-build is not set",
+    )
+    ap.add_argument("--platform", default="macos_universal", help="Platform key")
+    ap.add_argument("--channel", default="stable", choices=["stable", "beta", "nightly"])
+    ap.add_argument(
+        "--catalog-version",
+        default="",
+        help="Optional RFC3339 catalog version; default uses backend now()",
+    )
+    ap.add_argument("--skip-build", action="store_true", help="Skip build steps")
+    ap.add_argument("--skip-upload", action="store_true", help="Skip R2 upload")
+    ap.add_argument("--skip-publish", action="store_true", help="Skip catalog publish")
+    ap.add_argument(
+        "--publish-only",
+        action="store_true",
+        help="Only publish the catalog (no build, upload, or release registration)",
+    )
+    args = ap.parse_args(argv)
+
+    configs = [c.strip() for arg in args.configs for c in arg.split(",") if c.strip()]
+    # --build-script only builds python-tools.json, so --configs zips must already exist.
+    if configs and not args.skip_build:
+        ap.error(
+            "--configs requires --skip-build; build the zips first "
+            "(e.g. scripts/build_python_tools_variants_macos_universal.sh)"
+        )
+
+    backend_base, admin_token = backend_settings()
+
+    if args.publish_only:
+        publish_catalog(backend_base, admin_token, args.channel, args.catalog_version)
+        return 0
+
+    root = Path(__file__).resolve().parents[1]
+    if configs:
+        publish_many(
+            [(root / c).resolve() for c in configs],
+            args.platform,
+            args.channel,
+            args.catalog_version,
+            skip_upload=args.skip_upload,
+            skip_publish=args.skip_publish,
+        )
+        return 0
+
+    config_path = (root / args.config).resolve()
+    r2_bucket, r2_endpoint, r2_prefix = r2_settings()
+
+    # 1) Build artifacts
+    if not args.skip_build:
+        sh(["bash", str((root / args.build_script).resolve())])
+
+    release = locate_release(root, config_path, args.platform, r2_prefix)
+
+    # 2) Upload to R2
+    if not args.skip_upload:
+        upload_to_r2(release["zip_path"], r2_endpoint, r2_bucket, release["artifact_key"])
+
+    # 3) Register release
+    register_release(backend_base, admin_token, release)
+
     # 4) Publish catalog
     if not args.skip_publish:
-        publish_url = f"{backend_base}/admin/plugins/catalog/publish"
-        base_url = f"{backend_base}/plugins/artifacts"
-        payload = {"channel": args.channel, "base_url": base_url}
-        if args.catalog_version.strip():
-            payload["catalog_version"] = args.catalog_version.strip()
-        pub = http_post_json(publish_url, admin_token, payload)
-        print("published:", pub)
+        publish_catalog(backend_base, admin_token, args.channel, args.catalog_version)
 
     return 0
 
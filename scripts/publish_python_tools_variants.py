@@ -1,13 +1,163 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
+import itertools
+import json
 import os
 import subprocess
 import sys
+from collections.abc import Callable, Iterator
 from pathlib import Path
+from typing import TextIO
 
+import publish_python_tools_release as pub
 
-def sh(cmd: list[str]) -> None:
-    subprocess.run(cmd, check=True)
+
+# posix_spawn avoids fork()'s page-table copy; set to False to fall back to subprocess.Popen.
+_SPAWN_FAST = hasattr(os, "posix_spawnp")
+
+
+def spawn_with_stdout_pipe(cmd: list[str]) -> tuple[Callable[[], int], TextIO]:
+    # Start cmd with its stdout on a pipe; returns (wait -> exit code, readable stdout).
+    if not _SPAWN_FAST:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        return proc.wait, proc.stdout
+    # os.pipe() fds are close-on-exec, so the child only keeps the dup2'd stdout.
+    r_fd, w_fd = os.pipe()
+    try:
+        pid = os.posix_spawnp(
+            cmd[0], cmd, os.environ, file_actions=[(os.POSIX_SPAWN_DUP2, w_fd, 1)]
+        )
+    except BaseException:
+        os.close(r_fd)
+        raise
+    finally:
+        os.close(w_fd)
+
+    def wait() -> int:
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status)
+
+    return wait, os.fdopen(r_fd, "r")
+
+
+def stream_build(cmd: list[str]) -> Iterator[str]:
+    # Run the build script and yield each variant as soon as it reports
+    # "READY <variant> <zip_path>"; all other output is passed through.
+    wait, out = spawn_with_stdout_pipe(cmd)
+    try:
+        with out:
+            for line in out:
+                if line.startswith("READY "):
+                    yield line.split()[1]
+                else:
+                    print(line, end="", flush=True)
+    finally:
+        code = wait()
+    if code != 0:
+        raise subprocess.CalledProcessError(code, cmd)
+
+
+# Tracked inputs of the worker + plugin zip. Variant configs are hashed separately.
+BUILD_INPUTS = [
+    "Cargo.toml",
+    "build.rs",
+    "src",
+    "entitlements",
+    "examples",
+    "resources",
+    "scripts/plugins",
+    ":(exclude)scripts/plugins/config",
+    "scripts/build-python-bundle.sh",
+    "scripts/build_macos_universal_worker.sh",
+    "scripts/build_python_tools_variants_macos_universal.sh",
+]
+# Untracked (gitignored) files that still change the build.
+UNTRACKED_INPUTS = ["Cargo.lock"]
+
+
+def source_digest(root: Path) -> bytes:
+    out = subprocess.run(
+        ["git", "ls-files", "-z", "--", *BUILD_INPUTS],
+        cwd=root,
+        check=True,
+        capture_output=True,
+    ).stdout
+    h = hashlib.blake2b()
+    for rel in sorted(out.split(b"\0")):
+        if not rel:
+            continue
+        h.update(rel + b"\0")
+        try:
+            h.update((root / os.fsdecode(rel)).read_bytes())
+        except FileNotFoundError:
+            h.update(b"<deleted>")
+    for rel in UNTRACKED_INPUTS:
+        h.update(rel.encode() + b"\0")
+        try:
+            h.update((root / rel).read_bytes())
+        except FileNotFoundError:
+            h.update(b"<missing>")
+    return h.digest()
+
+
+def tree_fingerprint(h, path: Path) -> None:
+    # Stat-only listing (path, size, mtime) of a payload source, so rebuilt python-bundle-*
+    # dirs (untracked, and most of each zip) change the key without hashing their bytes.
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        h.update(f"{path}\0<missing>\0".encode())
+        return
+    h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+    if not path.is_dir():
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            p = os.path.join(dirpath, name)
+            st = os.lstat(p)
+            h.update(f"{p}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+
+
+def variant_digest(
+    source: bytes, root: Path, config_path: Path, platform: str, channel: str
+) -> str:
+    h = hashlib.blake2b(source)
+    raw = config_path.read_bytes()
+    h.update(raw)
+    config = json.loads(raw)
+    for item in config.get("payloads", []) + config.get("shared_payloads", []):
+        src = str(item.get("source", ""))
+        # ${...} sources are build outputs (the worker binary) covered by BUILD_INPUTS.
+        if src and "${" not in src:
+            tree_fingerprint(h, root / src)
+    h.update(f"\0{platform}\0{channel}".encode())
+    return h.hexdigest()
+
+
+def load_state(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def is_fresh(entry: dict | None, digest: str) -> bool:
+    if not entry or entry.get("hash") != digest:
+        return False
+    zip_path = Path(entry.get("zip_path", ""))
+    try:
+        st = zip_path.stat()
+    except OSError:
+        return False
+    if st.st_size != entry.get("zip_size") or st.st_mtime_ns != entry.get("zip_mtime_ns"):
+        return False
+    # The artifact key is the same on every machine, so the object must still be the one
+    # this machine uploaded, not just any object at that key.
+    bucket, endpoint, _ = pub.r2_settings()
+    head = pub.r2_object_head(endpoint, bucket, entry.get("artifact_key", ""))
+    return head is not None and head == entry.get("r2")
 
 
 def main() -> int:
@@ -25,6 +175,18 @@ def main() -> int:
         default="minimal,system,ds",
         help="Comma list: minimal,system,ds",
     )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Variants to upload concurrently (default: min(variants, 8))",
+    )
+    ap.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild and re-upload every variant even if its inputs are unchanged "
+        "(needed after changing inputs the cache can't see, e.g. toolchains or the signing key)",
+    )
     args = ap.parse_args()
 
     root = Path(__file__).resolve().parents[1]
@@ -42,41 +204,79 @@ def main() -> int:
         "ds": "scripts/plugins/config/python-tools-ds.json",
     }
 
-    if not args.skip_build:
-        sh(["bash", str(root / "scripts/build_python_tools_variants_macos_universal.sh")])
-
-    extra = ["--platform", args.platform, "--channel", args.channel]
-    if args.catalog_version.strip():
-        extra += ["--catalog-version", args.catalog_version.strip()]
-    if args.skip_upload:
-        extra += ["--skip-upload"]
-
-    publish_script = root / "scripts/publish_python_tools_release.py"
-
-    # Register all releases first; publish catalog once at the end.
-    for i, variant in enumerate(variants):
-        config_path = root / config_for[variant]
-        cmd = [
-            "python3",
-            str(publish_script),
-            "--config",
-            str(config_path),
-            "--platform",
-            args.platform,
-            "--channel",
-            args.channel,
-            "--skip-build",
-        ]
-        if args.catalog_version.strip():
-            cmd += ["--catalog-version", args.catalog_version.strip()]
-        if args.skip_upload:
-            cmd += ["--skip-upload"]
-
-        is_last = i == (len(variants) - 1)
-        if args.skip_publish or not is_last:
-            cmd += ["--skip-publish"]
-
-        sh(cmd)
+    # Skip build + upload for variants whose inputs hash to the same digest as the last
+    # successful run and whose artifact is still in R2. With --skip-build --skip-upload
+    # there is nothing to skip, so neither the sources nor R2 are touched.
+    state_path = root / ".cache/publish_python_tools/state.json"
+    state = {}
+    digests = {}
+    if not (args.skip_build and args.skip_upload):
+        state = {} if args.no_cache else load_state(state_path)
+        source = source_digest(root)
+        digests = {
+            variant: variant_digest(
+                source, root, root / config_for[variant], args.platform, args.channel
+            )
+            for variant in variants
+        }
+    fresh = {variant for variant in digests if is_fresh(state.get(variant), digests[variant])}
+    dirty = [variant for variant in variants if variant not in fresh]
+    for variant in sorted(fresh):
+        print(f"{variant}: unchanged since last publish; skipping build + upload")
+
+    catalog_ver = args.catalog_version.strip()
+
+    # Upload + register each variant on a thread pool as soon as its zip is built, while
+    # the build script moves on to the next one; publish the catalog once at the end.
+    ready = None
+    if not args.skip_build and dirty:
+        built = stream_build(
+            [
+                "bash",
+                str(root / "scripts/build_python_tools_variants_macos_universal.sh"),
+                *dirty,
+            ]
+        )
+        ready = (
+            root / config_for[variant]
+            for variant in itertools.chain((v for v in variants if v in fresh), built)
+        )
+    releases = pub.publish_many(
+        [root / config_for[variant] for variant in variants],
+        args.platform,
+        args.channel,
+        catalog_ver,
+        skip_upload=args.skip_upload,
+        skip_publish=args.skip_publish,
+        uploaded={root / config_for[variant] for variant in fresh},
+        ready=ready,
+        jobs=args.jobs or min(len(variants), 8),
+    )
+
+    # Only remember variants that were actually built and uploaded by this run, along with
+    # the R2 object's ETag + size right after our upload.
+    if not args.skip_build and not args.skip_upload:
+        bucket, endpoint, _ = pub.r2_settings()
+        for variant, rel in zip(variants, releases):
+            if variant in fresh:
+                continue
+            head = pub.r2_object_head(endpoint, bucket, rel["artifact_key"])
+            if head is None:
+                state.pop(variant, None)
+                continue
+            st = rel["zip_path"].stat()
+            state[variant] = {
+                "hash": digests[variant],
+                "zip_path": str(rel["zip_path"]),
+                "artifact_key": rel["artifact_key"],
+                "zip_size": st.st_size,
+                "zip_mtime_ns": st.st_mtime_ns,
+                "r2": head,
+            }
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = state_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        os.replace(tmp, state_path)
 
     return 0
 
@@ -1,3 +1,5 @@
+use base64::engine::general_purpose::STANDARD as b64;
+use base64::Engine;
 use pysandbox::{
     ExecutionMode, ExecutionOptions, NativePythonEngine, PythonEngine, PythonSandbox,
     SandboxConfig, SandboxedPythonEngine, SecurityProfile,
@@ -7,7 +9,9 @@ use serde_json::{json, Value};
 use std::collections::{HashMap, HashSet};
 use std::path::{Path, PathBuf};
 use std::process::Stdio;
-use tokio::io::{self, AsyncBufReadExt, AsyncWriteExt, BufReader};
+use tokio::io::{
+    self, AsyncBufRead, AsyncBufReadExt, AsyncReadExt, AsyncWrite, AsyncWriteExt, BufReader,
+};
 use tokio::process::Command;
 
 const DEFAULT_ENVS_DIR_NAME: &str = "python_envs";
@@ -32,6 +36,25 @@ impl PythonRuntime {
     }
 }
 
+/// Wire framing for JSON-RPC messages on stdin/stdout.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+enum Framing {
+    /// Newline-delimited JSON (MCP stdio default).
+    Lines,
+    /// `<u32 little-endian length><json bytes>`, so large payloads need no line scan.
+    LengthPrefixed,
+}
+
+impl Framing {
+    fn parse(s: &str) -> Option<Self> {
+        match s.trim().to_ascii_lowercase().as_str() {
+            "lines" | "ndjson" => Some(Self::Lines),
+            "length-prefixed" | "length_prefixed" => Some(Self::LengthPrefixed),
+            _ => None,
+        }
+    }
+}
+
 #[derive(Debug, Clone)]
 struct WorkerConfig {
     plugin_dir: Option<PathBuf>,
@@ -39,6 +62,7 @@ struct WorkerConfig {
     python_runtime_explicit: bool,
     python_path_override: Option<PathBuf>,
     sandbox_profile_path: Option<PathBuf>,
+    framing: Framing,
 }
 
 impl WorkerConfig {
@@ -59,6 +83,10 @@ impl WorkerConfig {
         let mut sandbox_profile_path = std::env::var("RZN_PYTHON_SANDBOX_PROFILE")
             .ok()
             .map(PathBuf::from);
+        let mut framing = std::env::var("RZN_WORKER_FRAMING")
+            .ok()
+            .and_then(|v| Framing::parse(&v))
+            .unwrap_or(Framing::Lines);
 
         let mut i = 1;
         while i < args.len() {
@@ -84,6 +112,12 @@ impl WorkerConfig {
                     }
                     i += 2;
                 }
+                "--framing" => {
+                    if let Some(f) = args.get(i + 1).and_then(|v| Framing::parse(v)) {
+                        framing = f;
+                    }
+                    i += 2;
+                }
                 _ => i += 1,
             }
         }
@@ -94,6 +128,7 @@ impl WorkerConfig {
             python_runtime_explicit,
             python_path_override,
             sandbox_profile_path,
+            framing,
         }
     }
 }
@@ -311,35 +346,86 @@ async fn main() -> anyhow::Result<()> {
         cfg.plugin_dir
     );
 
-    let stdin = BufReader::new(io::stdin());
-    let mut lines = stdin.lines();
+    let mut stdin = BufReader::new(io::stdin());
     let mut stdout = io::stdout();
 
-    while let Some(line) = lines.next_line().await? {
-        let line = line.trim();
-        if line.is_empty() {
+    while let Some(frame) = read_frame(&mut stdin, cfg.framing).await? {
+        if frame.iter().all(u8::is_ascii_whitespace) {
             continue;
         }
-        let parsed: Value = match serde_json::from_str(line) {
+        let parsed: Value = match serde_json::from_slice(&frame) {
             Ok(v) => v,
             Err(e) => {
-                tracing::warn!("invalid json-rpc line: {} | err={}", line, e);
+                tracing::warn!(
+                    "invalid json-rpc message: {} | err={}",
+                    String::from_utf8_lossy(&frame).trim(),
+                    e
+                );
                 continue;
             }
         };
 
         let response = handle_message(&cfg, parsed).await;
         if let Some(resp) = response {
-            let s = serde_json::to_string(&resp)?;
-            stdout.write_all(s.as_bytes()).await?;
-            stdout.write_all(b"\n").await?;
-            stdout.flush().await?;
+            let body = serde_json::to_vec(&resp)?;
+            write_frame(&mut stdout, cfg.framing, &body).await?;
         }
     }
 
     Ok(())
 }
 
+/// Read one message body; `None` on a clean EOF between messages.
+async fn read_frame<R: AsyncBufRead + Unpin>(
+    reader: &mut R,
+    framing: Framing,
+) -> io::Result<Option<Vec<u8>>> {
+    match framing {
+        Framing::Lines => {
+            let mut buf = Vec::new();
+            if reader.read_until(b'\n', &mut buf).await? == 0 {
+                return Ok(None);
+            }
+            Ok(Some(buf))
+        }
+        Framing::LengthPrefixed => {
+            let mut header = [0u8; 4];
+            match reader.read_exact(&mut header).await {
+                Ok(_) => {}
+                Err(e) if e.kind() == std::io::ErrorKind::UnexpectedEof => return Ok(None),
+                Err(e) => return Err(e),
+            }
+            let mut buf = vec![0u8; u32::from_le_bytes(header) as usize];
+            reader.read_exact(&mut buf).await?;
+            Ok(Some(buf))
+        }
+    }
+}
+
+async fn write_frame<W: AsyncWrite + Unpin>(
+    writer: &mut W,
+    framing: Framing,
+    body: &[u8],
+) -> io::Result<()> {
+    match framing {
+        Framing::Lines => {
+            writer.write_all(body).await?;
+            writer.write_all(b"\n").await?;
+        }
+        Framing::LengthPrefixed => {
+            let len = u32::try_from(body.len()).map_err(|_| {
+                io::Error::new(
+                    io::ErrorKind::InvalidData,
+                    "message exceeds u32 frame length",
+                )
+            })?;
+            writer.write_all(&len.to_le_bytes()).await?;
+            writer.write_all(body).await?;
+        }
+    }
+    writer.flush().await
+}
+
 async fn handle_message(cfg: &WorkerConfig, msg: Value) -> Option<Value> {
     let method = msg.get("method").and_then(|m| m.as_str()).unwrap_or("");
     let id = msg.get("id").cloned();
@@ -497,7 +583,16 @@ fn tools_list() -> Vec<Value> {
                     },
                     "python_path": { "type": "string", "description": "Override Python executable path. Relative paths are resolved against RZN_PLUGIN_DIR when present." },
                     "execution_mode": { "type": "string", "enum": ["native","workspace_isolated","platform_sandboxed"], "description": "Override execution mode. If omitted, derived from policy_id." },
-                    "timeout_seconds": { "type": "integer", "minimum": 1, "maximum": 600, "description": "Wall-clock timeout for the run." }
+                    "timeout_seconds": { "type": "integer", "minimum": 1, "maximum": 600, "description": "Wall-clock timeout for the run." },
+                    "output_sink": {
+                        "type": "object",
+                        "description": "Optional sink for bytes results (policy_id=yolo only). With {\"type\":\"file\",\"path\":...} the worker writes the raw bytes to a new file at path and returns a file_ref result instead of base64 data. Relative paths resolve against the worker's cwd; an existing file is never overwritten.",
+                        "properties": {
+                            "type": { "type": "string", "enum": ["file"] },
+                            "path": { "type": "string" }
+                        },
+                        "required": ["type", "path"]
+                    }
                 },
                 "required": ["code"],
                 "additionalProperties": true
@@ -728,6 +823,68 @@ fn parse_optional_string(args: &Value, key: &str) -> Option<String> {
         .filter(|s| !s.is_empty())
 }
 
+fn parse_output_sink(args: &Value) -> std::result::Result<Option<PathBuf>, Value> {
+    let Some(sink) = args.get("output_sink").filter(|v| !v.is_null()) else {
+        return Ok(None);
+    };
+    let kind = sink.get("type").and_then(|v| v.as_str()).unwrap_or("");
+    if kind != "file" {
+        return Err(json!({
+            "code": -32602,
+            "message": format!("Invalid 'output_sink.type': expected 'file', got '{}'", kind)
+        }));
+    }
+    match parse_optional_string(sink, "path") {
+        Some(path) => Ok(Some(PathBuf::from(path))),
+        None => Err(json!({
+            "code": -32602,
+            "message": "Missing required argument: output_sink.path"
+        })),
+    }
+}
+
+/// Resolve `path` against the cwd and canonicalize its parent directory, so the
+/// returned `file_ref` names the real location of the file.
+fn resolve_output_sink_path(path: &Path) -> std::io::Result<PathBuf> {
+    let file_name = path.file_name().ok_or_else(|| {
+        std::io::Error::new(std::io::ErrorKind::InvalidInput, "path has no file name")
+    })?;
+    let parent = match path.parent() {
+        Some(p) if !p.as_os_str().is_empty() => p.to_path_buf(),
+        _ => PathBuf::from("."),
+    };
+    Ok(parent.canonicalize()?.join(file_name))
+}
+
+/// Write a base64 `bytes` result to `path` and replace it with a `file_ref`, so
+/// large binary results don't travel back over the JSON-RPC pipe.
+fn spill_bytes_result(payload: &mut Value, path: &Path) -> std::result::Result<(), String> {
+    let Some(result) = payload.get_mut("result") else {
+        return Ok(());
+    };
+    if result.get("type").and_then(|v| v.as_str()) != Some("bytes") {
+        return Ok(());
+    }
+    let data = result.get("data").and_then(|v| v.as_str()).unwrap_or("");
+    let bytes = b64
+        .decode(data.as_bytes())
+        .map_err(|e| format!("invalid base64 bytes result: {}", e))?;
+    let path = resolve_output_sink_path(path)
+        .map_err(|e| format!("invalid output_sink {}: {}", path.display(), e))?;
+    std::fs::OpenOptions::new()
+        .write(true)
+        .create_new(true)
+        .open(&path)
+        .and_then(|mut f| std::io::Write::write_all(&mut f, &bytes))
+        .map_err(|e| format!("failed to write output_sink {}: {}", path.display(), e))?;
+    *result = json!({
+        "type": "file_ref",
+        "path": path,
+        "size": bytes.len()
+    });
+    Ok(())
+}
+
 async fn python_env_list_call(args: &Value) -> std::result::Result<Value, Value> {
     let include_broken = parse_bool(args, "include_broken", true);
     let base_dir = managed_envs_base_dir();
@@ -1146,6 +1303,14 @@ async fn python_sandbox_call(
         resolve_python_path(cfg, runtime, python_path_override.as_deref())?
     };
     let network_allowlist = parse_network_allowlist(args)?;
+    let output_sink = parse_output_sink(args)?;
+    if output_sink.is_some() && policy_id != "yolo" {
+        return Err(json!({
+            "code": -32602,
+            "message": "output_sink is only allowed with policy_id=yolo",
+            "data": { "policy_id": policy_id }
+        }));
+    }
 
     let limits = security_profile.resource_limits();
 
@@ -1206,7 +1371,11 @@ async fn python_sandbox_call(
     let exec = sandbox.execute(code, inputs, options).await;
 
     match exec {
-        Ok(payload) => {
+        Ok(mut payload) => {
+            if let Some(path) = output_sink.as_ref() {
+                spill_bytes_result(&mut payload, path)
+                    .map_err(|e| json!({ "code": -32000, "message": e }))?;
+            }
             let summary = summarize_payload(&payload);
             Ok(json!({
                 "content": [{ "type": "text", "text": summary }],
@@ -1283,6 +1452,7 @@ mod tests {
             python_runtime_explicit: explicit,
             python_path_override: None,
             sandbox_profile_path: None,
+            framing: Framing::Lines,
         }
     }
 
@@ -1322,6 +1492,89 @@ mod tests {
         assert_eq!(runtime, PythonRuntime::Bundled);
     }
 
+    #[test]
+    fn output_sink_requires_file_type_and_path() {
+        assert_eq!(parse_output_sink(&json!({})).unwrap(), None);
+        assert_eq!(
+            parse_output_sink(
+                &json!({ "output_sink": { "type": "file", "path": "/tmp/out.png" } })
+            )
+            .unwrap(),
+            Some(PathBuf::from("/tmp/out.png"))
+        );
+        assert!(
+            parse_output_sink(&json!({ "output_sink": { "type": "fd", "path": "3" } })).is_err()
+        );
+        assert!(parse_output_sink(&json!({ "output_sink": { "type": "file" } })).is_err());
+    }
+
+    #[test]
+    fn bytes_result_is_spilled_to_file_ref() {
+        let dir = tempfile::tempdir().unwrap();
+        let path = dir.path().join("out.bin");
+        let mut payload = json!({
+            "stdout": null,
+            "result": { "type": "bytes", "encoding": "base64", "data": b64.encode(b"\x89PNG") }
+        });
+        spill_bytes_result(&mut payload, &path).unwrap();
+        assert_eq!(std::fs::read(&path).unwrap(), b"\x89PNG");
+        assert_eq!(payload["result"]["type"], "file_ref");
+        assert_eq!(payload["result"]["size"], 4);
+        assert_eq!(
+            payload["result"]["path"],
+            json!(dir.path().canonicalize().unwrap().join("out.bin"))
+        );
+    }
+
+    #[test]
+    fn output_sink_never_overwrites_existing_file() {
+        let dir = tempfile::tempdir().unwrap();
+        let path = dir.path().join("out.bin");
+        std::fs::write(&path, b"keep").unwrap();
+        let mut payload = json!({
+            "result": { "type": "bytes", "encoding": "base64", "data": b64.encode(b"new") }
+        });
+        assert!(spill_bytes_result(&mut payload, &path).is_err());
+        assert_eq!(std::fs::read(&path).unwrap(), b"keep");
+        assert_eq!(payload["result"]["type"], "bytes");
+    }
+
+    #[tokio::test]
+    async fn length_prefixed_frames_round_trip() {
+        let mut wire = Vec::new();
+        write_frame(&mut wire, Framing::LengthPrefixed, br#"{"id":1}"#)
+            .await
+            .unwrap();
+        write_frame(&mut wire, Framing::LengthPrefixed, b"{}")
+            .await
+            .unwrap();
+        assert_eq!(&wire[..4], &8u32.to_le_bytes());
+
+        let mut reader = wire.as_slice();
+        let first = read_frame(&mut reader, Framing::LengthPrefixed)
+            .await
+            .unwrap();
+        assert_eq!(first.as_deref(), Some(&br#"{"id":1}"#[..]));
+        let second = read_frame(&mut reader, Framing::LengthPrefixed)
+            .await
+            .unwrap();
+        assert_eq!(second.as_deref(), Some(&b"{}"[..]));
+        assert!(read_frame(&mut reader, Framing::LengthPrefixed)
+            .await
+            .unwrap()
+            .is_none());
+    }
+
+    #[test]
+    fn framing_parse_accepts_known_names() {
+        assert_eq!(
+            Framing::parse("Length-Prefixed"),
+            Some(Framing::LengthPrefixed)
+        );
+        assert_eq!(Framing::parse("lines"), Some(Framing::Lines));
+        assert_eq!(Framing::parse("bogus"), None);
+    }
+
     #[test]
     fn policy_id_is_case_normalized() {
         let policy = policy_id_from_args(&json!({ "policy_id": "YOLO" }));